@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Download images from Figma prototype using Playwright, capturing progressively.
+Scrolls/pans the page in steps (down, then right, then back up, ...), harvests
+newly appeared images, canvases and inline SVGs at each step and downloads them
+in the background while the next step runs.
+Stops on its own once several steps in a row turn up nothing new.
+
+Usage:
+    python3 download_figma_images_v4.py [url] [--step-delay 0.4] [--idle-steps 3]
+    python3 download_figma_images_v4.py --benchmark
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+FIGMA_URL = "https://www.figma.com/proto/SvtNcyCmFhLaPRwENhxixT/%E4%B8%AD%E5%9B%BD%E5%A4%A7%E5%AD%A6%E7%9F%A2%E9%87%8F%E6%A0%A1%E5%BE%BD%E5%90%88%E9%9B%86--Community-?node-id=100-634&p=f&t=kLqYzMOxra36vpNG-0&scaling=min-zoom&content-scaling=fixed&page-id=0%3A217"
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Collects img src/data-src/srcset, CSS background images, canvas pixels and
+# inline SVG markup in a single round trip, instead of one query per element.
+# Anything returned by an earlier step is remembered in the page, so unchanged
+# canvases and SVGs (often megabytes) aren't sent back to Python every step.
+HARVEST_JS = r'''
+    () => {
+        const seen = window.__harvestSeen || (window.__harvestSeen = new Set());
+        const urls = [];
+        const push = (url, method) => {
+            if (url && !seen.has(url)) {
+                seen.add(url);
+                urls.push([url, method]);
+            }
+        };
+        // Malformed attribute values are kept as-is rather than aborting the harvest
+        const resolve = url => {
+            try {
+                return new URL(url, document.baseURI).href;
+            } catch(e) {
+                return url;
+            }
+        };
+        document.querySelectorAll('img').forEach(img => {
+            if (img.currentSrc) push(img.currentSrc, 'img_tag');
+            const src = img.getAttribute('src');
+            if (src) push(img.src, 'img_tag');
+            const dataSrc = img.getAttribute('data-src');
+            if (dataSrc) push(resolve(dataSrc), 'img_tag');
+            const srcset = img.getAttribute('srcset');
+            if (srcset) {
+                srcset.split(',').forEach(item => {
+                    const url = item.trim().split(/\s+/)[0];
+                    if (url) push(resolve(url), 'img_srcset');
+                });
+            }
+        });
+        document.querySelectorAll('*').forEach(el => {
+            const bgImage = window.getComputedStyle(el).backgroundImage;
+            if (bgImage && bgImage !== 'none') {
+                const matches = bgImage.match(/url\(["']?([^"')]+)["']?\)/g);
+                if (matches) {
+                    matches.forEach(match => {
+                        push(match.replace(/url\(["']?|["']?\)/g, ''), 'background');
+                    });
+                }
+            }
+        });
+        document.querySelectorAll('canvas').forEach(canvas => {
+            try {
+                const dataUrl = canvas.toDataURL('image/png');
+                if (dataUrl && dataUrl.startsWith('data:image')) {
+                    push(dataUrl, 'canvas');
+                }
+            } catch(e) {}
+        });
+        document.querySelectorAll('svg').forEach(svg => {
+            if (svg.outerHTML) push(svg.outerHTML, 'svg');
+        });
+        return urls;
+    }
+'''
+
+# Scroll offset and scrollable extent, used to tell whether a step moved at all.
+POSITION_JS = '''
+    () => [window.scrollX, window.scrollY,
+           document.documentElement.scrollWidth, document.documentElement.scrollHeight]
+'''
+
+
+def guess_extension(content_type, img_url):
+    """Map a Content-Type header to a file extension."""
+    ext = '.png'
+    if 'jpeg' in content_type or 'jpg' in content_type:
+        ext = '.jpg'
+    elif 'gif' in content_type:
+        ext = '.gif'
+    elif 'webp' in content_type:
+        ext = '.webp'
+    elif 'svg' in content_type:
+        ext = '.svg'
+    elif 'octet-stream' in content_type:
+        # Try to determine from URL
+        url_ext = os.path.splitext(urlparse(img_url).path)[1]
+        ext = url_ext if url_ext else '.bin'
+    return ext
+
+
+def save_image(img_url, method, index, output_dir, session):
+    """Write one harvested image to disk. Returns the filename, or None if skipped."""
+    if method == 'svg':
+        filename = f'figma_svg_{index:03d}.svg'
+        with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(img_url)
+        return filename
+    if img_url.startswith('data:'):
+        ext_match = re.search(r'data:image/(\w+);', img_url)
+        ext = '.' + ext_match.group(1) if ext_match else '.png'
+        content = base64.b64decode(img_url.split(',')[1])
+        filename = f'figma_canvas_{index:03d}{ext}'
+    elif img_url.startswith('blob:') or img_url.startswith('chrome-extension:'):
+        return None
+    else:
+        response = session.get(img_url, timeout=30)
+        response.raise_for_status()
+        content = response.content
+        ext = guess_extension(response.headers.get('Content-Type', ''), img_url)
+        filename = f'figma_image_{index:03d}{ext}'
+
+    with open(os.path.join(output_dir, filename), 'wb') as f:
+        f.write(content)
+    return filename
+
+
+class ProgressiveDownloader:
+    """Downloads harvested images on worker threads while capture continues."""
+
+    def __init__(self, output_dir, concurrency=8):
+        self.output_dir = output_dir
+        self.queue = asyncio.Queue()
+        self.seen = set()
+        self.image_urls = []
+        self.downloaded = 0
+        # requests.Session is not thread-safe, so each worker thread gets its own
+        self.local = threading.local()
+        self.sessions = []
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(concurrency)]
+
+    def _session(self):
+        import requests
+
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            self.local.session = session
+            self.sessions.append(session)
+        return session
+
+    def _download(self, url, method, index):
+        return save_image(url, method, index, self.output_dir, self._session())
+
+    def add(self, url, content_type, method):
+        """Queue a URL for download. Returns True if it had not been seen before."""
+        if not url:
+            return False
+        # Canvas data URLs and SVG markup can be megabytes each, so only their
+        # digest is kept once the payload has been queued.
+        if method == 'svg' or url.startswith('data:'):
+            key = 'sha1:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+        else:
+            key = url
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.image_urls.append({'url': key, 'type': content_type, 'method': method})
+        self.queue.put_nowait((len(self.image_urls), url, method))
+        return True
+
+    async def _worker(self):
+        while True:
+            index, url, method = await self.queue.get()
+            try:
+                filename = await asyncio.to_thread(self._download, url, method, index)
+                if filename:
+                    print(f"Downloaded: {filename} ({method})")
+                    self.downloaded += 1
+                else:
+                    print(f"Skipping URL: {url[:80]}")
+            except Exception as e:
+                print(f"Error downloading image {index}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        """Wait for queued downloads to finish and stop the workers."""
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        for session in self.sessions:
+            session.close()
+
+
+async def harvest(page, downloader):
+    """Queue every image currently on the page. Returns how many were new."""
+    found = await page.evaluate(HARVEST_JS)
+    new = 0
+    for url, method in found:
+        if method == 'canvas':
+            content_type = 'image/png'
+        elif method == 'svg':
+            content_type = 'image/svg+xml'
+        else:
+            content_type = 'image/unknown'
+        if downloader.add(url, content_type, method):
+            new += 1
+    return new
+
+
+class NetworkTracker:
+    """Tracks in-flight requests so an idle-looking step can wait for slow responses."""
+
+    def __init__(self, page):
+        self.inflight = set()
+        page.on('request', self._started)
+        page.on('requestfinished', self._finished)
+        page.on('requestfailed', self._finished)
+
+    def _started(self, request):
+        self.inflight.add(request)
+
+    def _finished(self, request):
+        self.inflight.discard(request)
+
+    async def wait_idle(self, timeout, poll=0.1):
+        """Wait until no requests are in flight, or `timeout` seconds pass."""
+        deadline = time.perf_counter() + timeout
+        while self.inflight and time.perf_counter() < deadline:
+            await asyncio.sleep(poll)
+
+
+async def capture_progressive(page, downloader, network, step_delay=0.4, idle_steps=3,
+                              idle_wait=2.0, max_steps=200):
+    """
+    Scroll/pan through the page in steps, harvesting after each one.
+
+    Sweeps vertically until that runs out, pans right by most of a viewport,
+    then sweeps vertically the other way, so content to the right of the first
+    viewport is reached too. Mouse wheel events scroll ordinary documents and
+    pan canvas-based prototypes alike.
+
+    A step that neither moves the page nor turns up new images first waits up
+    to `idle_wait` seconds for in-flight requests and harvests again. Stops
+    once `idle_steps` consecutive steps are still idle after that, or after
+    `max_steps`. New images count both harvested elements and network
+    responses, since panning a canvas prototype leaves the scroll offset
+    unchanged and mostly shows up as image requests.
+    """
+    viewport = page.viewport_size or {'width': 1920, 'height': 1080}
+    await page.mouse.move(viewport['width'] / 2, viewport['height'] / 2)
+    step_x = int(viewport['width'] * 0.8)
+    step_y = int(viewport['height'] * 0.8)
+
+    new = await harvest(page, downloader)
+    print(f"Step 0: {new} new images")
+    position = await page.evaluate(POSITION_JS)
+    idle = 0
+    steps = 0
+    horizontal = False
+    direction = 1
+    while steps < max_steps and idle < idle_steps:
+        steps += 1
+        before = len(downloader.image_urls)
+        if horizontal:
+            await page.mouse.wheel(step_x, 0)
+        else:
+            await page.mouse.wheel(0, direction * step_y)
+        await asyncio.sleep(step_delay)
+        await harvest(page, downloader)
+        new_position = await page.evaluate(POSITION_JS)
+        moved = new_position != position
+        position = new_position
+        if not moved and len(downloader.image_urls) == before:
+            await network.wait_idle(idle_wait)
+            await harvest(page, downloader)
+        new = len(downloader.image_urls) - before
+        print(f"Step {steps} ({'right' if horizontal else 'down' if direction > 0 else 'up'}): "
+              f"{new} new images")
+
+        if new or moved:
+            idle = 0
+            if horizontal:
+                # Panned sideways: sweep back along the vertical axis
+                horizontal = False
+                direction = -direction
+        else:
+            idle += 1
+            # Vertical travel has run out, try panning right
+            horizontal = True
+    return steps
+
+
+async def capture_single_scroll(page, downloader):
+    """The v3 approach: one jump to the bottom, a fixed wait, then one harvest."""
+    await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+    await asyncio.sleep(2)
+    return await harvest(page, downloader)
+
+
+async def download_with_playwright(url=FIGMA_URL, output_dir=None, progressive=True, settle_delay=5,
+                                   step_delay=0.4, idle_steps=3, idle_wait=2.0):
+    from playwright.async_api import async_playwright
+
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(__file__), 'downloaded_images')
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("Starting headless browser...")
+    downloader = ProgressiveDownloader(output_dir)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            user_agent=USER_AGENT
+        )
+        page = await context.new_page()
+        network = NetworkTracker(page)
+
+        def handle_response(response):
+            try:
+                resource_type = response.request.resource_type
+                content_type = response.headers.get('content-type', '')
+                if resource_type in ['image', 'media'] or 'image' in content_type.lower():
+                    downloader.add(response.url, content_type, response.request.method)
+            except Exception:
+                pass
+
+        page.on('response', handle_response)
+
+        print(f"Navigating to: {url}")
+        try:
+            await page.goto(url, wait_until='networkidle', timeout=60000)
+            print("Page loaded, waiting for content to render...")
+            await asyncio.sleep(settle_delay)
+
+            if progressive:
+                steps = await capture_progressive(
+                    page, downloader, network, step_delay, idle_steps, idle_wait)
+                print(f"Capture finished after {steps} steps")
+            else:
+                await capture_single_scroll(page, downloader)
+
+            print(f"Found {len(downloader.image_urls)} image URLs")
+
+        except Exception as e:
+            print(f"Error loading page: {e}")
+            import traceback
+            traceback.print_exc()
+
+        await browser.close()
+
+    print(f"\nWaiting for {downloader.queue.qsize()} remaining downloads...")
+    await downloader.close()
+    print(f"\nDownloaded {downloader.downloaded}/{len(downloader.image_urls)} images to {output_dir}")
+
+    # Save the list of found URLs
+    with open(os.path.join(output_dir, 'image_urls.json'), 'w') as f:
+        json.dump(downloader.image_urls, f, indent=2)
+    print(f"Saved image URLs list to: {os.path.join(output_dir, 'image_urls.json')}")
+
+    return downloader.downloaded, len(downloader.image_urls)
+
+
+def solid_png(index, size=64):
+    """Build a small solid-colour PNG so fixture images differ without Pillow."""
+    color = bytes(((index * 53) % 256, (index * 97) % 256, (index * 151) % 256))
+    raw = b''.join(b'\x00' + color * size for _ in range(size))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves the fixtures directory plus generated PNGs under /img/."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=FIXTURE_DIR, **kwargs)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith('/img/'):
+            digits = re.sub(r'\D', '', path)
+            offset = 1000 if 'bg-' in path else 2000 if 'far-' in path else 0
+            body = solid_png(int(digits or 0) + offset)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def benchmark(sections=40, step_delay=0.4, idle_steps=3, idle_wait=2.0):
+    """Compare single-scroll and progressive capture against the local fixture page."""
+    import tempfile
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/long_scroll.html?sections={sections}'
+
+    results = {}
+    try:
+        for mode, progressive in [('single-scroll', False), ('progressive', True)]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                downloaded, found = asyncio.run(download_with_playwright(
+                    url, output_dir, progressive=progressive, settle_delay=0.5,
+                    step_delay=step_delay, idle_steps=idle_steps, idle_wait=idle_wait))
+                results[mode] = (found, downloaded, time.perf_counter() - start)
+    finally:
+        server.shutdown()
+
+    # Each fixture section holds one <img>, one background image and one canvas,
+    # plus one <img> off to the right that only loads once panned into view.
+    print(f"\nFixture: {sections} sections, {sections * 4} lazily loaded assets")
+    print(f"{'mode':<15}{'found':>8}{'saved':>8}{'seconds':>10}")
+    for mode, (found, downloaded, elapsed) in results.items():
+        print(f"{mode:<15}{found:>8}{downloaded:>8}{elapsed:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('url', nargs='?', default=FIGMA_URL)
+    parser.add_argument('--single-scroll', action='store_true',
+                        help='use the v3 single jump-to-bottom capture instead')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='compare both capture modes on fixtures/long_scroll.html')
+    parser.add_argument('--sections', type=int, default=40,
+                        help='number of fixture sections for --benchmark')
+    parser.add_argument('--step-delay', type=float, default=0.4,
+                        help='seconds to let content load after each scroll/pan step')
+    parser.add_argument('--idle-steps', type=int, default=3,
+                        help='stop after this many consecutive steps with nothing new')
+    parser.add_argument('--idle-wait', type=float, default=2.0,
+                        help='max seconds an idle-looking step waits for in-flight requests')
+    args = parser.parse_args()
+    if args.step_delay < 0 or args.idle_wait < 0:
+        parser.error('--step-delay and --idle-wait must not be negative')
+    if args.idle_steps < 1:
+        parser.error('--idle-steps must be at least 1')
+
+    print("Checking for Playwright...")
+    try:
+        import playwright
+    except ImportError:
+        print("Playwright not installed. Please run: pip3 install playwright && python3 -m playwright install chromium")
+        return
+
+    print("Playwright found. Starting download...")
+    if args.benchmark:
+        benchmark(args.sections, args.step_delay, args.idle_steps, args.idle_wait)
+    else:
+        asyncio.run(download_with_playwright(
+            args.url, progressive=not args.single_scroll, step_delay=args.step_delay,
+            idle_steps=args.idle_steps, idle_wait=args.idle_wait))
+
+if __name__ == '__main__':
+    main()
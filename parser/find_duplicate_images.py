@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate images in a downloaded_images directory using perceptual hashes.
+Canvas grabs, network images and rasterized frames often show the same artwork at
+different sizes or encodings; byte-level comparison misses those, perceptual
+hashes don't.
+
+Computes aHash, dHash and pHash (64-bit each) for every raster image, batched with
+NumPy across a process pool, then groups hashes within a Hamming distance using a
+multi-index hash lookup rather than comparing every pair.
+
+Usage:
+    python3 find_duplicate_images.py [image_dir] [--hash phash] [--threshold 6]
+    python3 find_duplicate_images.py [image_dir] --prune pruned_images
+    python3 find_duplicate_images.py --benchmark 20000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
+HASH_TYPES = ('ahash', 'dhash', 'phash')
+HASH_BITS = 64
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so the 2-D transform is D @ X @ D.T."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    d = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    d[0] /= np.sqrt(2.0)
+    return d
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def _pack_bits(bits):
+    """Pack an (N, 64) boolean array into N uint64 hashes, first bit most significant."""
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+# Thumbnails whose channels all spread less than this (0-255 scale) count as flat:
+# blank canvases, solid fills. Their hash bits would otherwise come from rounding noise.
+FLAT_STD = 2.0
+# Bits of the flat hash given to each of R, G, B.
+FLAT_CHANNEL_BITS = (21, 21, 22)
+# XORed into flat hashes so they don't look like a plain run of ones.
+FLAT_MASK = np.random.default_rng(0x5eed).integers(0, 2, HASH_BITS).astype(bool)
+
+
+def flat_hashes(rgb_mean):
+    """
+    Hash flat images by their mean colour alone.
+
+    Each channel gets a thermometer code (the first k bits of its segment set,
+    k proportional to the channel value), so two flat images are the sum of
+    their per-channel level differences apart and only similar colours fall
+    within the threshold: (10, 10, 10) and (200, 200, 200) are ~48 bits apart,
+    black and pure blue ~22.
+    """
+    segments = []
+    for channel, width in enumerate(FLAT_CHANNEL_BITS):
+        levels = np.clip(np.rint(rgb_mean[:, channel] * width / 255.0), 0, width).astype(int)
+        segments.append(np.arange(width)[None, :] < levels[:, None])
+    return _pack_bits(np.concatenate(segments, axis=1) ^ FLAT_MASK)
+
+
+def hash_arrays(rgb32, gray9x8):
+    """
+    Compute aHash, dHash and pHash for a batch of images.
+
+    rgb32 is (N, 32, 32, 3) and gray9x8 is (N, 8, 9), both float.
+    Flat images get the same colour-based hash for all three types.
+    Returns a dict of hash type -> (N,) uint64 array.
+    """
+    n = len(rgb32)
+    pixels = rgb32.reshape(n, -1, 3)
+    flat = (pixels.std(axis=1) < FLAT_STD).all(axis=1)
+    flat_hash = flat_hashes(pixels.mean(axis=1))
+    # ITU-R 601-2 luma, the same transform as PIL's convert('L')
+    gray32 = rgb32 @ np.array([0.299, 0.587, 0.114], dtype=rgb32.dtype)
+    # aHash: 8x8 block means of the 32x32 thumbnail against their mean
+    small = gray32.reshape(n, 8, 4, 8, 4).mean(axis=(2, 4))
+    ahash = small > small.mean(axis=(1, 2), keepdims=True)
+    # dHash: horizontal gradient sign
+    dhash = gray9x8[:, :, 1:] > gray9x8[:, :, :-1]
+    # pHash: low-frequency 8x8 DCT coefficients against their median
+    low = (DCT_32 @ gray32 @ DCT_32.T)[:, :8, :8].reshape(n, 64)
+    phash = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    return {
+        'ahash': np.where(flat, flat_hash, _pack_bits(ahash)),
+        'dhash': np.where(flat, flat_hash, _pack_bits(dhash)),
+        'phash': np.where(flat, flat_hash, _pack_bits(phash)),
+    }
+
+
+# Transparent pixels are composited onto this before hashing, so artwork on a
+# transparent background hashes like the same artwork exported onto white.
+BACKGROUND = (255, 255, 255)
+
+
+def load_thumbnail(img):
+    """
+    Shrink an open image to a 64x64 RGB intermediate. Returns (thumbnail, blank).
+
+    JPEGs are decoded at reduced scale via draft() and everything else is box
+    reduced by an integer factor first, so LANCZOS never runs at full size.
+    Alpha is premultiplied while shrinking and then composited onto BACKGROUND.
+    blank is True for fully transparent images, which must not merge with
+    opaque ones however they composite.
+    """
+    img.draft('RGB', (128, 128))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+    factor = max(1, min(img.size) // 128)
+    if img.mode == 'RGB':
+        return img.reduce(factor).resize((64, 64), Image.LANCZOS), False
+    small = img.convert('RGBa').reduce(factor).resize((64, 64), Image.LANCZOS).convert('RGBA')
+    blank = small.getchannel('A').getextrema()[1] == 0
+    background = Image.new('RGBA', small.size, BACKGROUND + (255,))
+    return Image.alpha_composite(background, small).convert('RGB'), blank
+
+
+def hash_files(paths):
+    """Load and hash a chunk of image files. Runs in a worker process."""
+    rgb32 = []
+    gray9x8 = []
+    blank = []
+    ok = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                small, is_blank = load_thumbnail(img)
+            rgb32.append(np.asarray(small.resize((32, 32), Image.LANCZOS), dtype=np.float32))
+            gray = small.convert('L').resize((9, 8), Image.LANCZOS)
+            gray9x8.append(np.asarray(gray, dtype=np.float32))
+            blank.append(is_blank)
+            ok.append(path)
+        except Exception as e:
+            print(f"Error reading {os.path.basename(path)}: {e}")
+    if not ok:
+        return [], {name: np.empty(0, dtype=np.uint64) for name in HASH_TYPES}, np.empty(0, dtype=bool)
+    return ok, hash_arrays(np.stack(rgb32), np.stack(gray9x8)), np.array(blank)
+
+
+def compute_hashes(paths, workers=None, chunk_size=256):
+    """
+    Hash all paths across a process pool.
+
+    Returns (paths, {hash type: uint64 array}, blank), where blank flags fully
+    transparent images.
+    """
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    hashed_paths = []
+    parts = defaultdict(list)
+    blanks = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for ok, hashes, blank in pool.map(hash_files, chunks):
+            hashed_paths.extend(ok)
+            blanks.append(blank)
+            for name in HASH_TYPES:
+                parts[name].append(hashes[name])
+    return hashed_paths, {
+        name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=np.uint64)
+        for name in HASH_TYPES
+    }, np.concatenate(blanks) if blanks else np.empty(0, dtype=bool)
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(x):
+        return np.bitwise_count(x)
+else:
+    _POPCOUNT_8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(x):
+        x = np.ascontiguousarray(x, dtype=np.uint64)
+        return _POPCOUNT_8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def _segment_bounds(threshold):
+    """Split the 64 bits into threshold + 1 contiguous segments (pigeonhole)."""
+    segments = min(threshold + 1, HASH_BITS)
+    edges = np.linspace(0, HASH_BITS, segments + 1).round().astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def find_pairs(hashes, threshold, block=1024):
+    """
+    Return (i, j) index pairs, i < j, whose hashes differ in at most `threshold` bits.
+
+    Multi-index hashing: with threshold + 1 disjoint bit segments, any two hashes
+    within the threshold agree exactly on at least one segment, so only hashes
+    sharing a segment value are compared.
+    Returns (pairs as an (M, 2) int array, number of candidate comparisons).
+    """
+    if not 0 <= threshold <= HASH_BITS:
+        raise ValueError(f"threshold must be between 0 and {HASH_BITS}, got {threshold}")
+    n = len(hashes)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64), 0
+
+    found = []
+    comparisons = 0
+    for start, end in _segment_bounds(threshold):
+        width = end - start
+        keys = (hashes >> np.uint64(HASH_BITS - end)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            bucket_hashes = hashes[bucket]
+            for row in range(0, len(bucket), block):
+                rows = bucket[row:row + block]
+                dist = popcount(bucket_hashes[row:row + block, None] ^ bucket_hashes[None, :])
+                comparisons += dist.size
+                ii, jj = np.nonzero(dist <= threshold)
+                a, b = rows[ii], bucket[jj]
+                keep = a < b
+                if keep.any():
+                    found.append(np.stack([a[keep], b[keep]], axis=1))
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int64), comparisons
+    # The same pair can match on several segments
+    return np.unique(np.concatenate(found), axis=0), comparisons
+
+
+def cluster_pairs(n, pairs):
+    """Union-find over matched pairs. Returns clusters (lists of indices) of size > 1."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    groups = defaultdict(list)
+    for i in range(n):
+        groups[find(i)].append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def pick_representative(paths):
+    """Keep the largest-resolution image, then the largest file."""
+    def score(path):
+        with Image.open(path) as img:
+            width, height = img.size
+        return (width * height, os.path.getsize(path))
+    return max(paths, key=score)
+
+
+def list_images(image_dir):
+    return sorted(
+        os.path.join(image_dir, name)
+        for name in os.listdir(image_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def find_duplicates(image_dir, hash_type='phash', threshold=6, workers=None):
+    """Hash every image in image_dir and group near-duplicates. Returns a report dict."""
+    paths = list_images(image_dir)
+    print(f"Hashing {len(paths)} images in {image_dir}...")
+
+    start = time.perf_counter()
+    paths, hashes, blank = compute_hashes(paths, workers)
+    hash_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pairs, comparisons = find_pairs(hashes[hash_type], threshold)
+    # Fully transparent images only ever match each other
+    pairs = pairs[blank[pairs[:, 0]] == blank[pairs[:, 1]]]
+    clusters = cluster_pairs(len(paths), pairs)
+    group_time = time.perf_counter() - start
+
+    print(f"Hashed {len(paths)} images in {hash_time:.2f}s")
+    print(f"Grouped in {group_time:.2f}s ({comparisons} candidate comparisons, "
+          f"{len(pairs)} matching pairs)")
+    print(f"Found {len(clusters)} near-duplicate clusters")
+
+    return {
+        'hash': hash_type,
+        'threshold': threshold,
+        'images': {
+            os.path.basename(path): {
+                **{name: f'{int(hashes[name][i]):016x}' for name in HASH_TYPES},
+                'transparent': bool(blank[i]),
+            }
+            for i, path in enumerate(paths)
+        },
+        'clusters': [
+            {
+                'keep': os.path.basename(pick_representative([paths[i] for i in members])),
+                'members': [os.path.basename(paths[i]) for i in members],
+            }
+            for members in clusters
+        ],
+    }
+
+
+def same_directory(a, b):
+    return os.path.realpath(a) == os.path.realpath(b)
+
+
+def prune(image_dir, report, output_dir):
+    """Copy every image except the non-kept cluster members into output_dir."""
+    if same_directory(image_dir, output_dir):
+        raise ValueError(f"Prune directory must differ from the image directory: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+    dropped = {
+        name
+        for cluster in report['clusters']
+        for name in cluster['members']
+        if name != cluster['keep']
+    }
+    kept = 0
+    for name in report['images']:
+        if name not in dropped:
+            shutil.copy2(os.path.join(image_dir, name), os.path.join(output_dir, name))
+            kept += 1
+    print(f"Copied {kept} images to {output_dir} ({len(dropped)} near-duplicates dropped)")
+
+
+def _write_synthetic(args):
+    """Render one base pattern plus resized / re-encoded variants. Runs in a worker."""
+    base, output_dir, variants = args
+    rng = np.random.default_rng(base)
+    pattern = Image.fromarray(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8))
+    img = pattern.resize((128, 128), Image.BICUBIC)
+    img.save(os.path.join(output_dir, f'syn_{base:06d}_0.png'))
+    for v in range(1, variants):
+        size = (64, 96, 160)[v % 3]
+        variant = img.resize((size, size), Image.LANCZOS)
+        if v % 2:
+            variant.save(os.path.join(output_dir, f'syn_{base:06d}_{v}.jpg'), quality=70)
+        else:
+            variant.save(os.path.join(output_dir, f'syn_{base:06d}_{v}.webp'), quality=80)
+
+
+# Solid fills that must each form their own cluster; flat images are common
+# among canvas grabs. The greys are >= 35 levels (~9 hash bits) apart, and the
+# fully transparent entry (a blank canvas grab) must stay apart from black.
+SOLID_COLOURS = tuple((g, g, g) for g in (0, 45, 85, 128, 170, 210, 255)) + (
+    (255, 0, 0), (0, 200, 0), (0, 0, 255), (0, 0, 0, 0))
+
+
+def _write_solids(output_dir, variants):
+    """Render each solid colour at several sizes and encodings."""
+    for i, colour in enumerate(SOLID_COLOURS):
+        for v in range(variants):
+            size = (100, 50, 160)[v % 3]
+            if len(colour) == 4:
+                img = Image.new('RGBA', (size, size), colour)
+                ext = ('.png', '.webp')[v % 2]
+            else:
+                img = Image.new('RGB', (size, size), colour)
+                ext = ('.png', '.jpg', '.webp')[v % 3]
+            img.save(os.path.join(output_dir, f'syn_solid{i}_{v}{ext}'))
+
+
+def benchmark(count, hash_type='phash', threshold=6, workers=None, variants=4):
+    """Generate `count` synthetic images in groups of `variants` and time the pipeline."""
+    import tempfile
+
+    bases = max(1, count // variants)
+    with tempfile.TemporaryDirectory() as image_dir:
+        print(f"Generating {bases * variants} synthetic images ({bases} groups of {variants})...")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_write_synthetic, [(b, image_dir, variants) for b in range(bases)],
+                          chunksize=64))
+        _write_solids(image_dir, variants)
+        print(f"Generated in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        report = find_duplicates(image_dir, hash_type, threshold, workers)
+        total = time.perf_counter() - start
+
+    # Ground truth: files sharing a syn_<base>_ prefix are the same artwork
+    def base_of(name):
+        return name.split('_')[1]
+
+    def recovered(solid):
+        return sum(
+            1 for c in report['clusters']
+            if len(c['members']) == variants
+            and len({base_of(m) for m in c['members']}) == 1
+            and base_of(c['members'][0]).startswith('solid') == solid
+        )
+
+    mixed = sum(1 for c in report['clusters'] if len({base_of(m) for m in c['members']}) > 1)
+    clustered = sum(len(c['members']) for c in report['clusters'])
+    print(f"\nImages: {len(report['images'])}, total time {total:.2f}s")
+    print(f"Groups recovered exactly: {recovered(False)}/{bases}")
+    print(f"Solid colour groups recovered exactly: {recovered(True)}/{len(SOLID_COLOURS)}")
+    print(f"Clusters mixing different artwork: {mixed}")
+    print(f"Images left unclustered: {len(report['images']) - clustered}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('image_dir', nargs='?',
+                        default=os.path.join(os.path.dirname(__file__), 'downloaded_images'))
+    parser.add_argument('--hash', choices=HASH_TYPES, default='phash',
+                        help='hash used for grouping (all three are reported)')
+    parser.add_argument('--threshold', type=int, default=6,
+                        help='maximum Hamming distance between near-duplicates')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--output', default=None,
+                        help='report path (default: <image_dir>/duplicates.json)')
+    parser.add_argument('--prune', metavar='DIR', default=None,
+                        help='copy one image per cluster plus all unique images into DIR')
+    parser.add_argument('--benchmark', type=int, metavar='N', default=None,
+                        help='run on N synthetic images instead of image_dir')
+    args = parser.parse_args()
+
+    if not 0 <= args.threshold <= HASH_BITS:
+        parser.error(f'--threshold must be between 0 and {HASH_BITS}')
+    if args.prune and same_directory(args.prune, args.image_dir):
+        parser.error('--prune must point to a different directory than image_dir')
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.hash, args.threshold, args.workers)
+        return
+
+    report = find_duplicates(args.image_dir, args.hash, args.threshold, args.workers)
+    for cluster in report['clusters']:
+        print(f"  keep {cluster['keep']}: {', '.join(cluster['members'])}")
+
+    output = args.output or os.path.join(args.image_dir, 'duplicates.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved report to: {output}")
+
+    if args.prune:
+        prune(args.image_dir, report, args.prune)
+
+if __name__ == '__main__':
+    main()